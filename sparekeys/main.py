@@ -3,59 +3,31 @@
 """\
 Create an encrypted archive of the keys and secrets you might need to recover 
 from a catastrophic hard-drive failure.
-
-Usage:
-    sparekeys [options]
-    sparekeys plugins
-
-Subcommands:
-    plugins:
-        List and briefly describe any installed plugins.
-
-Options:
-    -y --yes
-        Don't prompt for any information, and assume the answer to any 
-        question is yes.  This is necessary if running in the background.
-
-    -v --verbose
-        Output more information, include stack traces.
-
-    -q --quiet
-        Eliminate any unnecessary output (implies --yes).
 """
 
 __version__ = '0.1.4'
 __author__ = "Ken & Kale Kundert"
 __slug__ = 'sparekeys'
 
-import sys, os, shlex
-import toml, appdirs, docopt
-import pkg_resources
+import sys, os, errno, shlex, shutil, json, pickle, hashlib, subprocess
+import argparse
 
 from collections import namedtuple
-from pkg_resources import iter_entry_points
 from inform import (
     display, error, Error, fatal, full_stop, get_informer,
     Inform as set_output_prefs, narrate, os_error, output, plural, terminate,
     warn,
 )
 from shlib import (
-    cd, chmod, cp, ls, mkdir, mount, rm, Run as run, to_path, set_prefs as
+    cd, chmod, cp, mkdir, mount, rm, Run as run, to_path, set_prefs as
     set_shlib_prefs
 )
-from textwrap import shorten
 from functools import lru_cache
+from importlib import import_module
+from subprocess import PIPE
 from shutil import get_terminal_size
-from getpass import getuser
-from socket import gethostname
-from arrow import now
-from gnupg import GPG
 
-PARAMS = {
-    'date': now(),
-    'user': getuser(),
-    'host': gethostname(),
-}
+PLUGIN_STAGES = 'archive', 'publish', 'auth'
 
 def main():
     """
@@ -66,17 +38,24 @@ def main():
     configuration files, and `setuptools` plugins.
     """
     set_shlib_prefs(use_inform=True, log_cmd=True)
-    args = docopt.docopt(__doc__)
+    args = parse_args()
 
-    if args['--verbose']:
+    if args.verbose:
         set_output_prefs(verbose=True, narrate=True)
-    elif args['--quiet']:
+    elif args.quiet:
         set_output_prefs(quiet=True)
 
     try:
+        if args.command == 'registry':
+            if args.action == 'freeze':
+                freeze_registry()
+            if args.action == 'unfreeze':
+                unfreeze_registry()
+            sys.exit()
+
         config_path, config = load_config()
         try:
-            if args['plugins']:
+            if args.command == 'plugins':
                 list_plugins(config)
                 sys.exit()
 
@@ -84,7 +63,7 @@ def main():
             # goes wrong with the passcode, we don't need to worry about 
             # cleaning up the unencrypted archive.
             passcode = query_passcode(config)
-            batch = args['--yes'] or args['--quiet']
+            batch = args.yes or args.quiet
             archive = build_archive(config, not batch)
             encrypt_archive(config, archive, passcode)
             publish_archive(config, archive)
@@ -99,7 +78,7 @@ def main():
         print()
 
     except Error as e:
-        if args['--verbose']: raise
+        if args.verbose: raise
         else: e.report()
 
     except OSError as e:
@@ -108,8 +87,45 @@ def main():
     terminate()
 
 
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog=__slug__, description=__doc__)
+    parser.add_argument(
+            '-y', '--yes', action='store_true',
+            help="Don't prompt for any information, and assume the answer to "
+                 "any question is yes.  This is necessary if running in the "
+                 "background.",
+    )
+    parser.add_argument(
+            '-v', '--verbose', action='store_true',
+            help="Output more information, include stack traces.",
+    )
+    parser.add_argument(
+            '-q', '--quiet', action='store_true',
+            help="Eliminate any unnecessary output (implies --yes).",
+    )
+
+    subcommands = parser.add_subparsers(dest='command', metavar='<command>')
+    subcommands.add_parser(
+            'plugins',
+            help="List and briefly describe any installed plugins.",
+    )
+    registry = subcommands.add_parser(
+            'registry',
+            help="Manage the record of installed plugins.",
+    )
+    registry.add_argument(
+            'action', choices=['freeze', 'unfreeze'],
+            help="'freeze': Search for installed plugins and record them, so "
+                 "the search doesn't need to be repeated each time sparekeys "
+                 "runs.  The record is automatically updated when packages "
+                 "are installed or removed.  'unfreeze': Delete the record of "
+                 "installed plugins.",
+    )
+
+    return parser.parse_args(argv)
+
 def load_config():
-    config_dir = to_path(appdirs.user_config_dir(__slug__))
+    config_dir = get_config_dir()
     config_path = config_dir / 'config.toml'
     inform = get_informer()
     inform.set_logfile(config_dir / 'log')
@@ -120,10 +136,12 @@ def load_config():
         mkdir(config_dir)
         cp(defaults, config_path)
 
-    try:
-        config = toml.load(config_path)
-    except toml.decoder.TomlDecodeError as e:
-        raise ConfigError(str(e), culprit=config_path)
+    # The config file rarely changes, so reuse the result of parsing it last 
+    # time, if possible.
+    config = read_config_cache(config_path)
+    if config is None:
+        config = parse_config(config_path)
+        write_config_cache(config_path, config)
 
     # Set default values for options that are accessed in multiple places: 
     config.setdefault('plugins', {})
@@ -133,16 +151,66 @@ def load_config():
 
     return config_path, config
 
+def parse_config(config_path):
+    try:
+        import tomllib
+    except ImportError:
+        import tomli as tomllib
+
+    try:
+        with open(config_path, 'rb') as f:
+            return tomllib.load(f)
+    except tomllib.TOMLDecodeError as e:
+        raise ConfigError(str(e), culprit=config_path)
+
+def read_config_cache(config_path):
+    try:
+        with open(get_config_cache_path(), 'rb') as f:
+            key, config = pickle.load(f)
+    except Exception:
+        # Unpickling can fail in many ways; any failure just means that the 
+        # config file needs to be parsed again.
+        return None
+
+    if key != get_config_cache_key(config_path):
+        return None
+
+    return config
+
+def write_config_cache(config_path, config):
+    cache = get_config_cache_key(config_path), config
+
+    try:
+        replace_file(get_config_cache_path(), pickle.dumps(cache))
+    except OSError as e:
+        narrate(f"Failed to cache config file: {os_error(e)}")
+
+def get_config_cache_path():
+    return get_cache_dir() / 'config.pickle'
+
+def get_config_cache_key(config_path):
+    stat = os.stat(config_path)
+    return str(config_path), stat.st_mtime_ns, stat.st_size
+
 def query_passcode(config):
     narrate("Getting a passcode for the archive")
 
     # The authentication system is special in that if no plugins are specified, 
     # the 'getpass' plugin will be used by default.
     plugins = select_plugins(config, 'auth', ['getpass'])
+    subconfigs = config.get('auth', {})
+
+    # Skip any plugins the user has disabled without importing them.
+    plugins = [
+            x for x in plugins
+            if not subconfigs.get(x.name, {}).get('disable', False)
+    ]
+    if not plugins:
+        raise ConfigError("All 'auth' plugins are disabled, cannot encrypt archive.")
 
     # Try each authentication method until one works.
     for plugin in plugins:
-        subconfig = config.get('auth', {}).get(plugin.name, {})
+        subconfig = subconfigs.get(plugin.name, {})
 
         try:
             return eval_plugin(plugin, config, subconfig)
@@ -161,12 +229,14 @@ def build_archive(config, interactive=True):
         raise ConfigError(f"'plugins.archive' not specified, nothing to do.")
 
     # Make the archive directory:
-    name = config.get('archive_name', '{host}').format(**PARAMS)
-    workspace = to_path(appdirs.user_data_dir(__slug__), name)
+    name = config.get('archive_name', '{host}').format(**get_params())
+    workspace = get_data_dir() / name
     archive = to_path(workspace / 'archive')
 
-    rm(workspace)
-    mkdir(archive)
+    # Only remove the workspace if a previous run left it behind.
+    if workspace.exists():
+        shutil.rmtree(workspace)
+    archive.mkdir(parents=True)
 
     # Apply any 'archive' plugins:
     for plugin in plugins:
@@ -174,12 +244,17 @@ def build_archive(config, interactive=True):
         run_plugin(plugin, config, subconfigs, archive)
 
     # Show the user which files were included in the archive.
+    # Print them all at once, because displaying each one individually is slow 
+    # for archives with thousands of files.
     display("The following files were included in the archive:")
 
-    for root, _, files in os.walk(archive):
-        root = to_path(root).relative_to(archive)
-        for file in files: 
-            display('   ', root / file)
+    paths = [
+            '    ' + os.path.relpath(os.path.join(root, file), archive)
+            for root, _, files in os.walk(archive)
+            for file in files
+    ]
+    if paths:
+        display('\n'.join(paths))
     display()
 
     if interactive:
@@ -188,38 +263,104 @@ def build_archive(config, interactive=True):
     return workspace
 
 def encrypt_archive(config, workspace, passcode):
+    import tarfile
+    from gzip import GzipFile
+
     narrate("Encrypting the archive")
 
     with cd(workspace):
-        run('tar -cf archive.tgz archive', 'soEW')
-        with open('archive.tgz', 'rb') as f:
-            cleartext = f.read()
-
-        gpg = GPG()
-        encrypted = gpg.encrypt(
-            cleartext,
-            recipients=None,
-            symmetric=True,
-            passphrase=str(passcode),
-        )
-        if encrypted.ok:
-            with open('archive.tgz.gpg', 'w') as f:
-                f.write(str(encrypted))
-        else:
-            raise EncryptionFailed(encrypted)
+        # Stream the archive through gzip and directly into gpg, so that 
+        # neither an unencrypted tarball nor the whole archive in memory is 
+        # ever needed.  Use the fastest compression level: higher levels gain 
+        # little on small key/config files, and cost more CPU than the extra 
+        # bytes cost gpg.  Compress in parallel with `pigz` if it's installed.
+        gpg = start_gpg(passcode, 'archive.tgz.gpg')
+        pipeline = [gpg]
 
-        rm('archive.tgz', 'archive')
+        try:
+            pigz = shutil.which('pigz')
+            if pigz:
+                gzip = subprocess.Popen(
+                        [pigz, '-1'], stdin=PIPE, stdout=gpg.stdin, bufsize=0)
+                gpg.stdin.close()
+                pipeline.insert(0, gzip)
+                stream = gzip.stdin
+            else:
+                stream = GzipFile(
+                        fileobj=gpg.stdin, mode='wb', compresslevel=1)
+
+            # Write to the pipe in 1 MiB blocks, rather than the default 10 KiB, 
+            # to reduce the number of system calls.  Dereference symbolic 
+            # links, so that files linked into the archive from other 
+            # filesystems are read directly from their original locations.
+            with stream:
+                tar = tarfile.open(
+                        fileobj=stream, mode='w|', bufsize=1 << 20,
+                        dereference=True,
+                )
+                with tar:
+                    tar.add('archive')
+
+        except BrokenPipeError:
+            # Some process quit early; exit statuses are checked below.
+            pass
+        except:
+            for proc in pipeline:
+                proc.kill()
+            raise
+        finally:
+            for proc in pipeline:
+                try:
+                    if proc.stdin:
+                        proc.stdin.close()
+                except BrokenPipeError:
+                    pass
+                proc.wait()
+
+        for proc in pipeline:
+            if proc.returncode != 0:
+                name = os.path.basename(proc.args[0])
+                raise EncryptionFailed(f"{name} exited with status {proc.returncode}.")
+
+        rm('archive')
 
     script = workspace / 'decrypt.sh'
     script.write_text('''\
 #!/bin/sh
 # Decrypts the archive.
 
-gpg -d -o - archive.tgz.gpg | tar xvf -
+gpg -d -o - archive.tgz.gpg | tar xzvf -
 ''')
     chmod(0o700, script, workspace / 'archive.tgz.gpg')
     narrate(f"Local archive '{workspace.name}' created.")
 
+def start_gpg(passcode, output):
+    # Loopback mode is required (since gpg 2.1) to read the passphrase from a 
+    # file descriptor.
+    cmd = [
+            'gpg', '--batch', '--yes', '--pinentry-mode', 'loopback',
+            '--symmetric', '--output', output,
+    ]
+
+    # The archive is already compressed.
+    cmd += ['--compress-algo', 'none']
+
+    read_fd, write_fd = os.pipe()
+    cmd += ['--passphrase-fd', str(read_fd)]
+
+    try:
+        gpg = subprocess.Popen(cmd, stdin=PIPE, bufsize=0, pass_fds=[read_fd])
+    except:
+        os.close(write_fd)
+        raise
+    finally:
+        os.close(read_fd)
+
+    with open(write_fd, 'w') as f:
+        f.write(str(passcode))
+
+    return gpg
+
 def publish_archive(config, workspace):
     results = []
 
@@ -239,7 +380,7 @@ def delete_archive(config, workspace):
 
 def list_plugins(config):
     # Work out the width of each column:
-    stages = 'archive', 'publish', 'auth'
+    stages = PLUGIN_STAGES
     defaults = {'auth': ['getpass']}
     max_on = 2
     max_type = max(
@@ -265,12 +406,13 @@ def list_plugins(config):
     for stage in stages:
         installed = load_plugins(stage).values()
         enabled = select_plugins(config, stage, defaults.get(stage))
-        plugins = enabled + [x for x in installed if x not in enabled]
+        enabled_names = {x.name for x in enabled}
+        plugins = enabled + [x for x in installed if x.name not in enabled_names]
 
         for i, plugin in enumerate(plugins):
-            summary = (plugin.__doc__ or "No summary").strip().split('\n')[0]
+            summary = (plugin.resolve().__doc__ or "No summary").strip().split('\n')[0]
             output(row.format(
-                '*' if plugin in enabled else '',
+                '*' if plugin.name in enabled_names else '',
                 stage if i == 0 else '',
                 plugin.name,
                 shorten(summary, width=max_desc, placeholder='...'),
@@ -284,16 +426,137 @@ def load_plugins(stage):
     plugins = {}
     group = '.'.join([__slug__, stage])
 
-    # Load any plugins that are installed.
-    for entry_point in iter_entry_points(group=group):
-        plugin = entry_point.load()
-        plugin.name = entry_point.name
-        plugin.module = entry_point.module_name
-        plugin.stage = stage
-        plugins[plugin.name] = plugin
+    # Find any plugins that are installed.  Don't import them yet, because 
+    # most won't be used and some have expensive dependencies.
+    for name, value in load_frozen_entry_points(group).items():
+        plugins[name] = Plugin(stage, name, value)
 
     return plugins
 
+def load_entry_point(value):
+    module, _, attrs = value.partition(':')
+    obj = import_module(module.strip())
+
+    # Ignore any extras, e.g. 'module:attr [extra]'.
+    for attr in attrs.split('[')[0].strip().split('.'):
+        if attr:
+            obj = getattr(obj, attr)
+
+    return obj
+
+def load_frozen_entry_points(group):
+    """
+    Return a dictionary mapping the names of the entry points in the given 
+    group to their values (e.g. 'package.module:attr').
+
+    Searching the installed distributions for entry points is slow, so the 
+    results are cached in the plugin registry.  The registry is rebuilt 
+    whenever any distribution on `sys.path` is installed, removed, or updated.
+    """
+    return load_registry()['entry_points'].get(group, {})
+
+def iter_entry_points(group):
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:
+        from importlib_metadata import entry_points
+
+    eps = entry_points()
+
+    # `select()` was added in python 3.10; older versions return a dictionary 
+    # mapping group names to lists of entry points.
+    if hasattr(eps, 'select'):
+        return eps.select(group=group)
+    else:
+        return eps.get(group, [])
+
+@lru_cache()
+def load_registry():
+    # Only read (and validate) the registry once per process, rather than once 
+    # for each plugin stage.
+    registry = read_registry()
+    if registry is None:
+        registry = freeze_registry()
+    return registry
+
+def read_registry():
+    try:
+        with open(get_registry_path()) as f:
+            registry = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if not isinstance(registry, dict):
+        return None
+    if registry.get('key') != get_registry_key():
+        return None
+
+    return registry
+
+def freeze_registry():
+    load_registry.cache_clear()
+    registry = {
+            'key': get_registry_key(),
+            'entry_points': {},
+    }
+    for stage in PLUGIN_STAGES:
+        group = '.'.join([__slug__, stage])
+        registry['entry_points'][group] = {
+                x.name: x.value
+                for x in sorted(iter_entry_points(group), key=lambda x: x.name)
+        }
+
+    # Failing to write the registry isn't an error; the entry points will just 
+    # be searched for again next time.
+    path = get_registry_path()
+    try:
+        replace_file(path, json.dumps(registry).encode())
+    except OSError as e:
+        narrate(f"Failed to write plugin registry: {os_error(e)}")
+    else:
+        narrate(f"Plugin registry written to '{path}'.")
+
+    return registry
+
+def unfreeze_registry():
+    load_registry.cache_clear()
+    path = get_registry_path()
+    rm(path)
+    narrate(f"Plugin registry '{path}' removed.")
+
+def get_registry_path():
+    return get_cache_dir() / 'entry_points.json'
+
+def get_registry_key():
+    """
+    Return a hash that changes whenever the entry points of any installed 
+    distribution might have changed.
+
+    This only requires listing each directory on `sys.path` and stat-ing the 
+    `entry_points.txt` file of each distribution found there, which is much 
+    cheaper than parsing the metadata of every distribution.
+    """
+    key = hashlib.sha1()
+
+    for dir in sys.path:
+        key.update(os.fsencode(dir) + b'\0')
+        try:
+            names = sorted(os.listdir(dir or '.'))
+        except OSError:
+            continue
+
+        for name in names:
+            if not name.endswith(('.dist-info', '.egg-info')):
+                continue
+            try:
+                stat = os.stat(os.path.join(dir or '.', name, 'entry_points.txt'))
+            except OSError:
+                continue
+            key.update(os.fsencode(name))
+            key.update(f':{stat.st_mtime_ns}:{stat.st_size}\0'.encode())
+
+    return key.hexdigest()
+
 def select_plugins(config, stage, defaults=None):
     installed_plugins = load_plugins(stage)
 
@@ -321,11 +584,14 @@ def run_plugin(plugin, config, subconfigs, *args, **kwargs):
         subconfigs = [{}]
 
     for subconfig in subconfigs:
+        if subconfig.get('disable', False):
+            continue
+
         try:
             result = eval_plugin(plugin, config, subconfig, *args, **kwargs)
             results.append(result)
 
-        except SkipPlugin:
+        except SkipPlugin as e:
             display(f"Skipping the '{plugin.stage}.{plugin.name}' plugin: {e}")
             continue
 
@@ -335,7 +601,7 @@ def eval_plugin(plugin, config, subconfig, *args, **kwargs):
     narrate(f"Running the '{plugin.stage}.{plugin.name}' plugin")
 
     try:
-        return plugin(subconfig, *args, **kwargs)
+        return plugin.resolve()(subconfig, *args, **kwargs)
 
     except PluginError as e:
         e.plugin = plugin
@@ -389,10 +655,8 @@ def archive_gpg(config, archive):
     """
     Copy `~/.gnupg` into the archive.
     """
-    dest = archive / '.gnupg'; mkdir(dest)
     # Don't try to copy sockets (S.*); it won't work.
-    srcs = list(ls('~/.gnupg', reject='S.*'))
-    cp(srcs, dest)
+    copy_to_archive('~/.gnupg', archive, ignore=shutil.ignore_patterns('S.*'))
 
 def archive_file(config, archive):
     """
@@ -426,30 +690,96 @@ def archive_avendesora(config, archive):
 
 def publish_scp(config, workspace):
     """
-    Copy the archive to one or more remote hosts via `scp`.
+    Copy the archive to one or more remote hosts via `rsync` or `scp`.
     """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    from tempfile import TemporaryDirectory
+
     hosts = require_one_or_more(config, 'host')
     remote_dir = config.get('remote_dir', 'backup/sparekeys')
-    remote_dir = remote_dir.format(**PARAMS)
+    remote_dir = remote_dir.format(**get_params())
     run_flags = 'sOEW' if get_informer().quiet else 'soEW'
 
-    for host in hosts:
+    # Only use `rsync` if asked to, because it must also be installed on the 
+    # remote host.  The delta-transfer algorithm is disabled, because no two 
+    # encryptions of the archive are alike.
+    rsync = config.get('rsync', False) and shutil.which('rsync')
+
+    def publish(host):
         try:
-            run(['ssh', host, f'mkdir -p {remote_dir}'], run_flags)
-            run(['scp', '-r', workspace, f'{host}:{remote_dir}'], run_flags)
+            run(['ssh', *ssh_opts, host, f'mkdir -p {remote_dir}'], run_flags)
+            if rsync:
+                ssh_cmd = ' '.join(shlex.quote(x) for x in ['ssh', *ssh_opts])
+                run([
+                    rsync, '-a', '--whole-file', '-e', ssh_cmd,
+                    f'{workspace}/',
+                    f'{host}:{remote_dir}/{workspace.name}/',
+                ], run_flags)
+            else:
+                run(['scp', *ssh_opts, '-r', workspace, f'{host}:{remote_dir}'],
+                        run_flags)
         except Error as e:
             e.reraise(codicil=e.cmd)
+        finally:
+            subprocess.run(
+                    ['ssh', *ssh_opts, '-O', 'exit', host],
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL,
+            )
         display(f"Archive copied to '{host}'.")
 
+    # Share one connection between the `ssh` and `scp` commands for each host, 
+    # so the connection only needs to be set up and authenticated once.  The 
+    # connection is closed (via `-O exit`) as soon as the host is finished, 
+    # and times out on its own if that doesn't happen for some reason.
+    with TemporaryDirectory(prefix=f'{__slug__}-') as control_dir:
+        ssh_opts = [
+                '-o', 'ControlMaster=auto',
+                '-o', f'ControlPath={control_dir}/%C',
+                '-o', 'ControlPersist=60',
+        ]
+
+        # Copying to each host is network-bound, so by default do it in 
+        # parallel.  Try every host, report each one that fails, and then fail 
+        # once at the end.
+        failed = []
+
+        def report(host, e):
+            error(e, culprit=host)
+            failed.append(host)
+
+        if config.get('parallel', True):
+            with ThreadPoolExecutor(max_workers=len(hosts)) as executor:
+                futures = {executor.submit(publish, x): x for x in hosts}
+                for future in as_completed(futures):
+                    try:
+                        future.result()
+                    except Error as e:
+                        report(futures[future], e)
+        else:
+            for host in hosts:
+                try:
+                    publish(host)
+                except Error as e:
+                    report(host, e)
+
+        if failed:
+            raise PluginError(
+                    f"Failed to copy archive to {len(failed)} of {len(hosts)} host(s).",
+                    codicil=', '.join(x for x in hosts if x in failed),
+            )
+
 def publish_mount(config, workspace):
     """
     Copy the archive to one or more mounted/mountable drives.
     """
+    from concurrent.futures import ThreadPoolExecutor
+
     drives = require_one_or_more(config, 'drive')
     remote_dir = config.get('remote_dir', 'backup/sparekeys')
-    remote_dir = remote_dir.format(**PARAMS)
+    remote_dir = remote_dir.format(**get_params())
 
-    for drive in drives:
+    def publish(drive):
         narrate(f"copying archive to '{drive}'.")
         try:
             with mount(drive):
@@ -461,81 +791,226 @@ def publish_mount(config, workspace):
         else:
             display(f"Archive copied to '{drive}'.")
 
+    # Copying to each drive is IO-bound, so do it in parallel.
+    with ThreadPoolExecutor(max_workers=len(drives)) as executor:
+        for future in [executor.submit(publish, x) for x in drives]:
+            future.result()
+
 def publish_email(config, workspace):
     """
     Attach the archive in an email to yourself.
     """
-    raise NotImplementedError
-
-    # https://realpython.com/python-send-email/#option-2-setting-up-a-local-smtp-server
-    import email, smtplib, ssl
-    from email import encoders
-    from email.mime.base import MIMEBase
-    from email.mime.multipart import MIMEMultipart
-    from email.mime.text import MIMEText
+    import smtplib, ssl
+    from email.message import EmailMessage
+    from getpass import getpass
 
     # Load all the necessary information from the config file.
-    sender = config.get('sender', '{user}@{host}').format(**PARAMS)
-    recipient = require(config, 'recipient').format(**PARAMS)
-    subject = config.get('subject', 'Spare Keys').format(**PARAMS)
-    body = config.get('body', '').format(**PARAMS)
+    params = get_params()
+    sender = config.get('sender', '{user}@{host}').format(**params)
+    recipient = require(config, 'recipient').format(**params)
+    subject = config.get('subject', 'Spare Keys').format(**params)
+    body = config.get('body', '').format(**params)
     smtp_host = require(config, 'smtp_host')
-    smtp_port = require(config, 'smtp_port')
-
-    # Create a multipart message and set headers
-    message = MIMEMultipart()
-    message["From"] = sender
-    message["To"] = recipient
-    message["Subject"] = subject
-
-    # Add body to the email.
-    message.attach(MIMEText(body, "plain"))
-
-    # Add attachments to the email.
+    smtp_port = config.get('smtp_port', 0)
+    smtp_user = config.get('smtp_user')
+
+    message = EmailMessage()
+    message['From'] = sender
+    message['To'] = recipient
+    message['Subject'] = subject
+    message.set_content(body)
+
+    # Add the archive and the decryption script as attachments.  Email clients 
+    # can usually download the application/octet-stream MIME-type 
+    # automatically.
     attachments = [
             'archive.tgz.gpg',
             'decrypt.sh',
     ]
 
-    for attachment in attachemnts:
+    for attachment in attachments:
         path = workspace / attachment
-
-        # Open the attachment file in binary mode
         with path.open('rb') as f:
-            # Add file as application/octet-stream
-            # Email clients can usually download this MIME-type automatically.
-            part = MIMEBase("application", "octet-stream")
-            part.set_payload(f.read())
-
-        # Encode file in ASCII characters to send by email    
-        encoders.encode_base64(part)
-
-        # Add header as key/value pair to attachment part
-        part.add_header(
-            "Content-Disposition",
-            f"attachment; filename={attachment}",
-        )
-
-        # Add attachment to message and convert message to string
-        message.attach(part)
+            message.add_attachment(
+                    f.read(),
+                    maintype='application',
+                    subtype='octet-stream',
+                    filename=attachment,
+            )
 
-    text = message.as_string()
+    # Send the email, logging in (over TLS) if a user name was given.
+    try:
+        with smtplib.SMTP(smtp_host, smtp_port) as server:
+            if smtp_user:
+                server.starttls(context=ssl.create_default_context())
+                try:
+                    password = getpass(f"Password for '{smtp_user}' on '{smtp_host}': ")
+                except EOFError:
+                    print()
+                    raise SkipPlugin("Received EOF")
+                server.login(smtp_user, password)
+            server.send_message(message)
 
-    # Log in to server using secure context and send email
-    password = input("Type your email password and press enter:")
+    except (smtplib.SMTPException, OSError) as e:
+        raise PluginError(str(e), culprit=smtp_host)
 
-    with smtplib.SMTP(smtp_host, smtp_port) as server:
-        server.sendmail(sender_email, receiver_email, text)
+    display(f"Archive emailed to '{recipient}'.")
 
 
-def copy_to_archive(path, archive):
+def copy_to_archive(path, archive, ignore=None):
     src = to_path(path)
     dest = archive / src.relative_to(to_path('~'))
-    mkdir(dest.parent)
-    cp(src, dest)
+    os.makedirs(dest.parent, exist_ok=True)
+
+    if src.is_dir():
+        merge_tree(src, dest, ignore=ignore)
+    else:
+        link_or_copy_file(src, dest)
+
+def merge_tree(src, dest, ignore=None):
+    """
+    Link or copy the given directory into the archive, like `copytree()`, but 
+    merge it with anything that's already there.
+
+    More than one plugin can put the same files in the archive, e.g. 
+    `archive.ssh` and `archive.file` with `src = '~/.ssh/config'`.
+    """
+    names = os.listdir(src)
+    ignored = ignore(src, names) if ignore else set()
+    os.makedirs(dest, exist_ok=True)
+
+    for name in names:
+        if name in ignored:
+            continue
+
+        src_name = os.path.join(src, name)
+        dest_name = os.path.join(dest, name)
+
+        if os.path.isdir(src_name):
+            merge_tree(src_name, dest_name, ignore=ignore)
+        else:
+            link_or_copy_file(src_name, dest_name)
+
+    shutil.copystat(src, dest)
+
+def link_or_copy_file(src, dest):
+    """
+    Link to the given file if possible, otherwise copy it.
+
+    The archive is deleted as soon as it's encrypted, so there's no need to 
+    duplicate any data.  Hard links are preferred, because they can't be 
+    broken by the original file moving.  Symbolic links are used if the 
+    archive is on a different filesystem; they are dereferenced when the 
+    archive is encrypted.  Any other error (e.g. a missing source file) is 
+    raised, so that it's noticed while the archive is being built.
+
+    If the destination already exists, it's removed first rather than 
+    overwritten, because it may be a link to the user's real file.
+    """
+    if os.path.lexists(dest):
+        os.unlink(dest)
+
+    try:
+        os.link(src, dest)
+        return dest
+    except OSError as e:
+        if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+            raise
+
+    try:
+        os.symlink(os.path.abspath(src), dest)
+        return dest
+    except OSError:
+        pass
+
+    return copy_file(src, dest)
+
+def copy_file(src, dest):
+    """
+    Copy the contents, permissions, and timestamps of the given file.
+
+    The contents are copied within the kernel (i.e. via `sendfile()`), without 
+    passing through a userspace buffer.
+    """
+    if sys.version_info >= (3, 8):
+        # `copyfile()` uses `sendfile()` on linux since python 3.8.
+        shutil.copyfile(src, dest)
+    else:
+        with open(src, 'rb') as fsrc, open(dest, 'wb') as fdest:
+            offset = 0
+            size = os.fstat(fsrc.fileno()).st_size
+            while offset < size:
+                sent = os.sendfile(
+                        fdest.fileno(), fsrc.fileno(), offset, size - offset)
+                if not sent:
+                    break
+                offset += sent
+
+    stat = os.stat(src)
+    os.chmod(dest, stat.st_mode & 0o7777)
+    os.utime(dest, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+    return dest
+
+def replace_file(path, content):
+    """
+    Atomically replace the given file with the given bytes, so that concurrent 
+    readers never see a partially-written file.
+    """
+    tmp_path = path.with_name(f'{path.name}.{os.getpid()}')
+    try:
+        mkdir(path.parent)
+        tmp_path.write_bytes(content)
+        os.replace(tmp_path, path)
+    except OSError:
+        rm(tmp_path)
+        raise
+
+@lru_cache()
+def get_config_dir():
+    import appdirs
+    return to_path(appdirs.user_config_dir(__slug__))
+
+@lru_cache()
+def get_data_dir():
+    import appdirs
+    return to_path(appdirs.user_data_dir(__slug__))
+
+@lru_cache()
+def get_cache_dir():
+    import appdirs
+    return to_path(appdirs.user_cache_dir(__slug__))
+
+@lru_cache()
+def get_params():
+    """
+    Return the values that can be substituted into format strings in the 
+    config file.
+    """
+    from getpass import getuser
+    from socket import gethostname
+    from arrow import now
+
+    return {
+        'date': now(),
+        'user': getuser(),
+        'host': gethostname(),
+    }
+
+def shorten(text, width, placeholder='...'):
+    """
+    Collapse whitespace and truncate the given text to fit in the given width.
+
+    This is like `textwrap.shorten()`, but much cheaper because it doesn't 
+    bother breaking the text on word boundaries.
+    """
+    text = ' '.join(text.split())
+    if len(text) <= width:
+        return text
+    return text[:max(width - len(placeholder), 0)].rstrip() + placeholder
 
 def require(config, key):
-    try: value = config[key]
+    try: return config[key]
     except KeyError:
         raise SkipPlugin(f"No '{key}' specified.")
 
@@ -551,6 +1026,26 @@ def allow_zero_or_more(config, key):
     values = config.get(key, [])
     return values if isinstance(values, list) else [values]
 
+class Plugin:
+    """
+    An installed plugin, which is only imported when it's actually needed.
+    """
+
+    def __init__(self, stage, name, value):
+        self.stage = stage
+        self.name = name
+        self.value = value
+        self.module = value.split(':')[0].strip()
+        self._func = None
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.stage!r}, {self.name!r}, {self.value!r})'
+
+    def resolve(self):
+        if self._func is None:
+            self._func = load_entry_point(self.value)
+        return self._func
+
 class ConfigError(Error):
     pass
 
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+
+import pytest
+from types import SimpleNamespace
+from importlib import import_module
+
+# `sparekeys.main` refers to the `main()` function, not the module.
+sparekeys_main = import_module('sparekeys.main')
+
+FAKE_PLUGINS = {
+    'archive': ['file', 'ssh', 'gpg'],
+    'auth': ['getpass', 'avendesora'],
+    'publish': ['scp', 'mount'],
+}
+
+@pytest.fixture
+def fake_plugins(monkeypatch):
+    """
+    Make the tests independent of which plugins happen to be installed, and 
+    skip searching for entry points.
+    """
+
+    def load_plugins(stage):
+        return {
+                name: sparekeys_main.Plugin(
+                    stage, name, f'sparekeys:{stage}_{name}')
+                for name in FAKE_PLUGINS[stage]
+        }
+
+    monkeypatch.setattr(sparekeys_main, 'load_plugins', load_plugins)
+
+@pytest.fixture
+def fake_entry_points(monkeypatch):
+    """
+    Make the plugin registry independent of which distributions happen to be 
+    installed.
+    """
+
+    def iter_entry_points(group):
+        stage = group.split('.')[-1]
+        return [
+                SimpleNamespace(name=name, value=f'sparekeys:{stage}_{name}')
+                for name in FAKE_PLUGINS.get(stage, [])
+        ]
+
+    monkeypatch.setattr(sparekeys_main, 'iter_entry_points', iter_entry_points)
+
+@pytest.fixture
+def registry_path(tmp_path, monkeypatch):
+    path = tmp_path / 'entry_points.json'
+    monkeypatch.setattr(sparekeys_main, 'get_registry_path', lambda: path)
+    return path
+
+@pytest.fixture
+def cache_path(tmp_path, monkeypatch):
+    path = tmp_path / 'config.pickle'
+    monkeypatch.setattr(sparekeys_main, 'get_config_cache_path', lambda: path)
+    return path
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+
+import os
+import errno
+import pytest
+from sparekeys.main import copy_to_archive, archive_ssh, archive_file
+
+@pytest.fixture
+def home(tmp_path, monkeypatch):
+    home = tmp_path / 'home'
+    home.mkdir()
+    monkeypatch.setenv('HOME', str(home))
+    return home
+
+def test_hard_link(tmp_path, home):
+    (home / 'spam').write_text('eggs')
+    archive = tmp_path / 'archive'
+
+    copy_to_archive('~/spam', archive)
+
+    assert (archive / 'spam').read_text() == 'eggs'
+    assert os.path.samefile(archive / 'spam', home / 'spam')
+
+def test_cross_device_link(tmp_path, home, monkeypatch):
+    (home / 'spam').write_text('eggs')
+    archive = tmp_path / 'archive'
+
+    def link(src, dest):
+        raise OSError(errno.EXDEV, os.strerror(errno.EXDEV))
+
+    monkeypatch.setattr(os, 'link', link)
+    copy_to_archive('~/spam', archive)
+
+    assert (archive / 'spam').is_symlink()
+    assert (archive / 'spam').read_text() == 'eggs'
+
+def test_missing_source(tmp_path, home):
+    archive = tmp_path / 'archive'
+
+    with pytest.raises(FileNotFoundError):
+        copy_to_archive('~/spam', archive)
+
+    assert not (archive / 'spam').exists()
+    assert not (archive / 'spam').is_symlink()
+
+def test_overlapping_sources(tmp_path, home):
+    (home / '.ssh').mkdir()
+    (home / '.ssh' / 'config').write_text('config')
+    (home / '.ssh' / 'id_rsa').write_text('id_rsa')
+    archive = tmp_path / 'archive'
+
+    archive_ssh({}, archive)
+    archive_file({'src': ['~/.ssh/config', '~/.ssh']}, archive)
+
+    assert (archive / '.ssh' / 'config').read_text() == 'config'
+    assert (archive / '.ssh' / 'id_rsa').read_text() == 'id_rsa'
+
+def test_overwrite_link(tmp_path, home):
+    (home / 'spam').write_text('eggs')
+    (home / 'ham').write_text('ham')
+    archive = tmp_path / 'archive'
+    archive.mkdir()
+    (archive / 'spam').symlink_to(home / 'ham')
+
+    copy_to_archive('~/spam', archive)
+
+    # The file that the old link pointed to must not be written through.
+    assert (archive / 'spam').read_text() == 'eggs'
+    assert (home / 'ham').read_text() == 'ham'
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+
+import os
+import io
+import shutil
+import tarfile
+import subprocess
+import pytest
+from sparekeys.main import encrypt_archive
+
+pytestmark = pytest.mark.skipif(
+        not shutil.which('gpg'),
+        reason="gpg not installed",
+)
+
+@pytest.fixture
+def gnupg_home(tmp_path, monkeypatch):
+    home = tmp_path / 'gnupg'
+    home.mkdir(mode=0o700)
+    monkeypatch.setenv('GNUPGHOME', str(home))
+    yield home
+    subprocess.run(
+            ['gpgconf', '--kill', 'gpg-agent'],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+    )
+
+def decrypt(path, passcode):
+    gpg = subprocess.run([
+            'gpg', '--batch', '--pinentry-mode', 'loopback',
+            '--passphrase-fd', '0', '--decrypt', path,
+        ],
+        input=passcode.encode(),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        check=True,
+    )
+    return gpg.stdout
+
+@pytest.mark.parametrize('pigz', [False, True])
+def test_encrypt_archive(tmp_path, gnupg_home, monkeypatch, pigz):
+    if pigz and not shutil.which('pigz'):
+        pytest.skip("pigz not installed")
+    if not pigz:
+        which = shutil.which
+        monkeypatch.setattr(
+                'shutil.which', lambda x: None if x == 'pigz' else which(x))
+
+    elsewhere = tmp_path / 'elsewhere'
+    elsewhere.write_text('linked')
+
+    workspace = tmp_path / 'workspace'
+    archive = workspace / 'archive'
+    (archive / 'spam').mkdir(parents=True)
+    (archive / 'spam' / 'eggs').write_text('eggs')
+    (archive / 'ham').symlink_to(elsewhere)
+
+    encrypt_archive({}, workspace, 'hunter2')
+
+    assert not archive.exists()
+    assert os.access(workspace / 'decrypt.sh', os.X_OK)
+
+    tgz = decrypt(workspace / 'archive.tgz.gpg', 'hunter2')
+    with tarfile.open(fileobj=io.BytesIO(tgz), mode='r:gz') as tar:
+        assert sorted(tar.getnames()) == [
+                'archive',
+                'archive/ham',
+                'archive/spam',
+                'archive/spam/eggs',
+        ]
+
+        # Symbolic links are dereferenced.
+        ham = tar.getmember('archive/ham')
+        assert ham.isfile()
+        assert tar.extractfile(ham).read() == b'linked'
+        assert tar.extractfile('archive/spam/eggs').read() == b'eggs'
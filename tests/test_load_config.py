@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+
+import os
+import pytest
+from sparekeys.main import (
+        read_config_cache, write_config_cache, parse_config, ConfigError,
+)
+
+def test_config_cache(tmp_path, cache_path):
+    config_path = tmp_path / 'config.toml'
+    config_path.write_text("archive_name = 'spam'\n")
+    assert read_config_cache(config_path) is None
+
+    config = parse_config(config_path)
+    write_config_cache(config_path, config)
+    assert cache_path.exists()
+    assert read_config_cache(config_path) == {'archive_name': 'spam'}
+
+    config_path.write_text("archive_name = 'eggs'\n")
+    os.utime(config_path, ns=(0, 0))
+    assert read_config_cache(config_path) is None
+
+def test_corrupt_config_cache(tmp_path, cache_path):
+    config_path = tmp_path / 'config.toml'
+    config_path.write_text("archive_name = 'spam'\n")
+    cache_path.write_bytes(b'not a pickle')
+    assert read_config_cache(config_path) is None
+
+def test_parse_error(tmp_path):
+    config_path = tmp_path / 'config.toml'
+    config_path.write_text("archive_name = \n")
+    with pytest.raises(ConfigError):
+        parse_config(config_path)
@@ -1,7 +1,12 @@
 #!/usr/bin/env python3
 
 import pytest
-from sparekeys import *
+from sparekeys.main import (
+        select_plugins, query_passcode, run_plugin, auth_getpass,
+        Plugin, ConfigError,
+)
+
+pytestmark = pytest.mark.usefixtures('fake_plugins')
 
 def load_plugin_names(config, stage, defaults=None):
     plugins = select_plugins(config, stage, defaults)
@@ -53,3 +58,40 @@ def test_not_installed():
         select_plugins(config, 'archive')
 
 
+
+def test_resolve_plugin():
+    plugin = Plugin('auth', 'getpass', 'sparekeys:auth_getpass')
+    assert plugin.module == 'sparekeys'
+    assert plugin._func is None
+    assert plugin.resolve() is auth_getpass
+    assert plugin.resolve() is auth_getpass
+
+def test_disable_auth_plugin():
+    config = {
+        'plugins': {
+            'auth': ['getpass'],
+        },
+        'auth': {
+            'getpass': {'disable': True},
+        },
+    }
+    with pytest.raises(ConfigError, match="All 'auth' plugins are disabled"):
+        query_passcode(config)
+
+def test_disable_subconfig():
+    calls = []
+
+    def record(subconfig, archive):
+        calls.append(subconfig['name'])
+        return subconfig['name']
+
+    plugin = Plugin('archive', 'spam', 'sparekeys:archive_spam')
+    plugin._func = record
+
+    subconfigs = [
+        {'name': 'disabled', 'disable': True},
+        {'name': 'enabled', 'disable': False},
+        {'name': 'default'},
+    ]
+    assert run_plugin(plugin, {}, subconfigs, None) == ['enabled', 'default']
+    assert calls == ['enabled', 'default']
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+
+import pytest
+from sparekeys.main import publish_email, SkipPlugin
+
+class FakeSMTP:
+    instances = []
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.calls = []
+        self.messages = []
+        FakeSMTP.instances.append(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def starttls(self, context=None):
+        self.calls.append('starttls')
+
+    def login(self, user, password):
+        self.calls.append(('login', user, password))
+
+    def send_message(self, message):
+        self.calls.append('send_message')
+        self.messages.append(message)
+
+@pytest.fixture
+def smtp(monkeypatch):
+    FakeSMTP.instances = []
+    monkeypatch.setattr('smtplib.SMTP', FakeSMTP)
+    return FakeSMTP.instances
+
+@pytest.fixture
+def workspace(tmp_path):
+    (tmp_path / 'archive.tgz.gpg').write_bytes(b'archive')
+    (tmp_path / 'decrypt.sh').write_bytes(b'decrypt')
+    return tmp_path
+
+def test_publish_email(smtp, workspace):
+    config = {
+        'recipient': 'alice@example.com',
+        'sender': 'bob@example.com',
+        'subject': 'Spare Keys for {user}',
+        'body': 'spam',
+        'smtp_host': 'smtp.example.com',
+        'smtp_port': 25,
+    }
+    publish_email(config, workspace)
+
+    server, = smtp
+    assert server.host == 'smtp.example.com'
+    assert server.port == 25
+    assert server.calls == ['send_message']
+
+    message, = server.messages
+    assert message['From'] == 'bob@example.com'
+    assert message['To'] == 'alice@example.com'
+    assert message['Subject'].startswith('Spare Keys for ')
+    assert message.get_body().get_content() == 'spam\n'
+
+    attachments = {
+            x.get_filename(): (x.get_content_type(), x.get_content())
+            for x in message.iter_attachments()
+    }
+    assert attachments == {
+            'archive.tgz.gpg': ('application/octet-stream', b'archive'),
+            'decrypt.sh': ('application/octet-stream', b'decrypt'),
+    }
+
+def test_publish_email_login(smtp, workspace, monkeypatch):
+    monkeypatch.setattr('getpass.getpass', lambda prompt: 'hunter2')
+    config = {
+        'recipient': 'alice@example.com',
+        'smtp_host': 'smtp.example.com',
+        'smtp_user': 'alice',
+    }
+    publish_email(config, workspace)
+
+    server, = smtp
+    assert server.calls == [
+            'starttls',
+            ('login', 'alice', 'hunter2'),
+            'send_message',
+    ]
+
+def test_publish_email_eof(smtp, workspace, monkeypatch):
+    def getpass(prompt):
+        raise EOFError
+
+    monkeypatch.setattr('getpass.getpass', getpass)
+    config = {
+        'recipient': 'alice@example.com',
+        'smtp_host': 'smtp.example.com',
+        'smtp_user': 'alice',
+    }
+    with pytest.raises(SkipPlugin):
+        publish_email(config, workspace)
+
+    server, = smtp
+    assert server.calls == ['starttls']
+
+def test_publish_email_no_recipient(smtp, workspace):
+    config = {
+        'smtp_host': 'smtp.example.com',
+    }
+    with pytest.raises(SkipPlugin):
+        publish_email(config, workspace)
+
+    assert smtp == []
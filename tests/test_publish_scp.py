@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+
+import shlex
+import pytest
+from inform import Error
+from conftest import sparekeys_main
+from sparekeys.main import publish_scp, PluginError
+
+@pytest.fixture
+def commands(monkeypatch):
+    commands = []
+
+    def run(cmd, modes):
+        cmd = [str(x) for x in cmd]
+        commands.append(cmd)
+        # Only the copy fails, after the connection has been opened.
+        if cmd[0] == 'scp' and cmd[-1].startswith('bad'):
+            raise Error("unexpected exit status (1).", cmd=' '.join(cmd))
+
+    def subprocess_run(cmd, **kwargs):
+        commands.append([str(x) for x in cmd])
+
+    monkeypatch.setattr(sparekeys_main, 'run', run)
+    monkeypatch.setattr(sparekeys_main.subprocess, 'run', subprocess_run)
+    return commands
+
+@pytest.fixture
+def workspace(tmp_path):
+    workspace = tmp_path / 'spam'
+    workspace.mkdir()
+    return workspace
+
+def get_ssh_opts(commands):
+    # All the commands for all the hosts must share the same control socket.
+    control_paths = {
+            arg for cmd in commands for arg in cmd
+            if arg.startswith('ControlPath=')
+    }
+    control_path, = control_paths
+    assert control_path.endswith('/%C')
+
+    return [
+            '-o', 'ControlMaster=auto',
+            '-o', control_path,
+            '-o', 'ControlPersist=60',
+    ]
+
+@pytest.mark.parametrize('parallel', [True, False])
+def test_publish_scp(commands, workspace, parallel):
+    config = {
+        'host': ['alice', 'bob'],
+        'remote_dir': 'backup',
+        'parallel': parallel,
+    }
+    publish_scp(config, workspace)
+
+    ssh_opts = get_ssh_opts(commands)
+    expected = {
+            host: [
+                ['ssh', *ssh_opts, host, 'mkdir -p backup'],
+                ['scp', *ssh_opts, '-r', str(workspace), f'{host}:backup'],
+                ['ssh', *ssh_opts, '-O', 'exit', host],
+            ]
+            for host in config['host']
+    }
+    assert sorted(commands) == sorted(sum(expected.values(), []))
+
+    # The commands for each host must run in order.
+    for host, cmds in expected.items():
+        assert [x for x in commands if x in cmds] == cmds
+
+def test_publish_rsync(commands, workspace, monkeypatch):
+    monkeypatch.setattr('shutil.which', lambda x: f'/usr/bin/{x}')
+    config = {
+        'host': 'alice',
+        'remote_dir': 'backup',
+        'rsync': True,
+    }
+    publish_scp(config, workspace)
+
+    ssh_opts = get_ssh_opts(commands)
+    ssh_cmd = ' '.join(shlex.quote(x) for x in ['ssh', *ssh_opts])
+    assert commands == [
+            ['ssh', *ssh_opts, 'alice', 'mkdir -p backup'],
+            [
+                '/usr/bin/rsync', '-a', '--whole-file', '-e', ssh_cmd,
+                f'{workspace}/', f'alice:backup/{workspace.name}/',
+            ],
+            ['ssh', *ssh_opts, '-O', 'exit', 'alice'],
+    ]
+
+@pytest.mark.parametrize('parallel', [True, False])
+def test_publish_scp_failure(commands, workspace, parallel):
+    config = {
+        'host': ['bad1', 'alice', 'bad2'],
+        'remote_dir': 'backup',
+        'parallel': parallel,
+    }
+    with pytest.raises(PluginError) as err:
+        publish_scp(config, workspace)
+
+    assert err.value.get_codicil() == ('bad1, bad2',)
+
+    # Every host is tried, and every connection is closed, even the ones 
+    # where the copy failed.
+    ssh_opts = get_ssh_opts(commands)
+    for host in config['host']:
+        assert ['ssh', *ssh_opts, '-O', 'exit', host] in commands
+    assert ['scp', *ssh_opts, '-r', str(workspace), 'alice:backup'] in commands
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+
+import os
+import json
+import pytest
+from sparekeys.main import (
+        read_registry, freeze_registry, unfreeze_registry,
+        load_frozen_entry_points, load_entry_point, get_registry_key,
+        auth_getpass,
+)
+
+pytestmark = pytest.mark.usefixtures('fake_entry_points')
+
+def test_freeze_registry(registry_path):
+    assert read_registry() is None
+
+    registry = freeze_registry()
+    assert registry_path.exists()
+    assert read_registry() == registry
+
+    entry_points = load_frozen_entry_points('sparekeys.auth')
+    assert entry_points == {
+            'avendesora': 'sparekeys:auth_avendesora',
+            'getpass': 'sparekeys:auth_getpass',
+    }
+
+def test_unfreeze_registry(registry_path):
+    freeze_registry()
+    unfreeze_registry()
+    assert not registry_path.exists()
+
+def test_stale_registry(registry_path):
+    freeze_registry()
+
+    registry = json.loads(registry_path.read_text())
+    registry['key'] = 'stale'
+    registry_path.write_text(json.dumps(registry))
+
+    assert read_registry() is None
+
+def test_load_entry_point():
+    assert load_entry_point('sparekeys:auth_getpass') is auth_getpass
+    assert load_entry_point('sparekeys.main:auth_getpass [extra]') is auth_getpass
+
+def test_registry_key_undecodable_path(tmp_path, monkeypatch):
+    # Paths that aren't valid UTF-8 are decoded with surrogate escapes.
+    dir = os.fsdecode(bytes(tmp_path) + b'/\xff')
+    dist_info = os.path.join(dir, os.fsdecode(b'\xff.dist-info'))
+    os.makedirs(dist_info)
+    open(os.path.join(dist_info, 'entry_points.txt'), 'w').close()
+    monkeypatch.setattr('sys.path', [dir])
+
+    key = get_registry_key()
+    assert key == get_registry_key()